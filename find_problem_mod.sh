@@ -98,22 +98,25 @@ extract_missing_ids() {
     echo -n $mods_id
 }
 
-find_mod_by_id() {
-  local target_id="$1"
+# 2.8  modId -> jar lookup, built once by build_modid_index
+# -------------------------------------------------------------------------
+declare -A MODID_INDEX=()
 
+build_modid_index() {
+  local jar modid
   while read -r jar; do
-    # Grab the first modId from this jar
-    local modid
     modid=$(get_modid_from_jar "$jar") || continue   # skip if we can't read it
-    
-    if [ "$modid" = "$target_id" ]; then
-      echo "$jar"          # one match – we can exit early or continue for all
-      return 0
-    fi
-
+    [[ -z $modid ]] && continue
+    # first jar wins on duplicates; always store the enabled name
+    [[ -z ${MODID_INDEX[$modid]} ]] && MODID_INDEX[$modid]="${jar%.disabled}"
   done < <(find "$MODS_DIR" -maxdepth 1 -type f -name '*.jar*')
+}
+
+find_mod_by_id() {
+  local target_id="$1"
 
-  return 1   # no jar matched the id
+  [[ -n ${MODID_INDEX[$target_id]} ]] || return 1   # no jar matched the id
+  echo "${MODID_INDEX[$target_id]}"
 }
 
 # -------------------------------------------------------------------------
@@ -121,6 +124,7 @@ find_mod_by_id() {
 # -------------------------------------------------------------------------
 
 enable_all
+build_modid_index
 
 MODS=$(find "$MODS_DIR" -maxdepth 1 -type f -name '*.jar')
 TOTAL=$(printf '%s\n' "$MODS" | wc -l | tr -d ' ')
@@ -27,10 +27,23 @@
 import pathlib
 import subprocess
 import re
-import time
 import zipfile
 import os
-from typing import Iterable, List, Optional
+import json
+import mmap
+import signal
+import threading
+import time
+from functools import cached_property
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tomllib                      # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib         # optional backport for older Pythons
+    except ImportError:
+        tomllib = None                  # fall back to _MODID_TOML_RE
 
 # ---------- CONFIGURATION ---------- #
 # Expand the user directory to an absolute path for all file operations.
@@ -38,73 +51,246 @@ SERVER_ROOT = "~/forge_server"
 SERVER_ROOT_ABS = os.path.expanduser(SERVER_ROOT)  # absolute path to the server directory
 SERVER_SCRIPT = "start.sh"              # script name inside SERVER_ROOT
 ERROR_STR = "Attempted to load class net/minecraft/client/gui/Gui for invalid dist DEDICATED_SERVER"
-TIMEOUT = 20
+TIMEOUT = 300                           # seconds; runs normally end earlier, once the log shows the result
 MODS_DIR = "mods"                       # sub‑dir inside SERVER_ROOT
 LOG_FILE = "server_log.txt"             # log file inside SERVER_ROOT
 # ----------------------------------- #
 
+LOG_PATH = pathlib.Path(SERVER_ROOT_ABS) / LOG_FILE
+MODS_PATH = pathlib.Path(SERVER_ROOT_ABS) / MODS_DIR
+
+_ERROR_BYTES = ERROR_STR.encode()
+# Forge prints one of these per unresolved dependency
+_MOD_ID_MARKER = b"Mod ID: '"
+_MOD_ID_RE = re.compile(rb"Mod ID: '([^']+)'")
+_LOG_CHUNK = 64 * 1024
+# seconds the server gets to shut down (and save) after SIGTERM
+_STOP_GRACE = 30
+# printed once the server has finished starting
+_DONE_MARKER = b'For help, type "help"'
+# modId in mods.toml (quotes excluded from the capture) and in mod.json;
+# the TOML pattern is only used when tomllib is unavailable or fails
+_MODID_TOML_RE = re.compile(r'modId\s*=\s*["\']?([^"\'\s]+)')
+_MODID_JSON_RE = re.compile(r'"modId"\s*:\s*"\s*([^"\s]+)')
+# leading modId-looking word of a jar name, e.g. "jei" in jei-1.20.1-forge-15.2.0.27.jar
+_FILENAME_MODID_RE = re.compile(r'^([a-z][a-z0-9_]{2,})[-_.]')
+
+# "path|size|mtime" -> modId, filled by get_modid_from_jar and persisted
+# to CACHE_PATH between runs
+CACHE_PATH = pathlib.Path.home() / ".cache" / "mercsniper" / "modids.json"
+_MODID_CACHE: Dict[str, Optional[str]] = {}
+
 # ---------- HELPERS ---------- #
+def _modid_from_toml(content) -> Optional[str]:
+    """Return the first `[[mods]]` modId of a mods.toml, or None if it
+    cannot be parsed."""
+    try:
+        modid = tomllib.loads(content)["mods"][0]["modId"]
+    except (tomllib.TOMLDecodeError, KeyError, IndexError, TypeError):
+        return None
+    return modid if isinstance(modid, str) else None
+
 def get_modid_from_jar(jar_path):
     """Return the `modId` string that is stored in either
     META‑INF/mods.toml or META‑INF/mod.json.
+
+    Results are cached per (path, size, mtime) so an unchanged jar is
+    only opened once, also across runs (see load_modid_cache).
     """
     jar_path = pathlib.Path(jar_path)
+    try:
+        st = jar_path.stat()
+    except OSError as e:
+        print(f"[DEBUG] Failed to read modId from {jar_path}: {e}")
+        return None
+    name = str(jar_path)
+    if name.endswith(".disabled"):          # same jar whether enabled or not
+        name = name[:-len(".disabled")]
+    key = f"{name}|{st.st_size}|{int(st.st_mtime)}"
+    if key in _MODID_CACHE:
+        return _MODID_CACHE[key]
+
+    modid = None
     try:
         with zipfile.ZipFile(jar_path, "r") as z:
-            meta_files = [
-                f for f in z.namelist()
-                if f.startswith("META-INF/") and (f.endswith("mods.toml") or f.endswith("mod.json"))
-            ]
-            if not meta_files:
-                return None
-            meta = meta_files[0]
-            content = z.read(meta).decode("utf-8", errors="ignore")
-            m = re.search(r"modId\s*=\s*([^\s]+)", content)
-            if m:
-                return m.group(1).strip().strip('"').strip("'")
-            m = re.search(r'"modId"\s*:\s*"([^"]+)"', content)
-            if m:
-                return m.group(1).strip()
+            meta = None
+            for info in z.infolist():
+                name = info.filename
+                if name.startswith("META-INF/") and (name.endswith("mods.toml") or name.endswith("mod.json")):
+                    meta = name
+                    break
+            if meta is not None:
+                content = z.read(meta).decode("utf-8", errors="ignore")
+                if tomllib is not None and meta.endswith("mods.toml"):
+                    modid = _modid_from_toml(content)
+                if modid is None:
+                    m = _MODID_TOML_RE.search(content) or _MODID_JSON_RE.search(content)
+                    if m:
+                        modid = m.group(1)
     except Exception as e:
         print(f"[DEBUG] Failed to read modId from {jar_path}: {e}")
-    return None
+        return None
+    _MODID_CACHE[key] = modid
+    return modid
+
+def guess_modid(jar_path) -> Optional[str]:
+    """Guess the modId from the jar's file name without opening it."""
+    m = _FILENAME_MODID_RE.match(pathlib.Path(jar_path).name.lower())
+    return m.group(1) if m else None
+
+def load_modid_cache():
+    """Fill _MODID_CACHE from CACHE_PATH, if it exists."""
+    try:
+        with CACHE_PATH.open("r") as f:
+            _MODID_CACHE.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"[DEBUG] Ignoring modId cache {CACHE_PATH}: {e}")
+
+def _cache_entry_current(key) -> bool:
+    """Whether a _MODID_CACHE key still matches a jar on disk (enabled or
+    disabled) with the same size and mtime."""
+    try:
+        path, size, mtime = key.rsplit("|", 2)
+        for candidate in (path, path + ".disabled"):
+            try:
+                st = os.stat(candidate)
+            except OSError:
+                continue
+            return st.st_size == int(size) and int(st.st_mtime) == int(mtime)
+    except ValueError:
+        pass
+    return False
+
+def save_modid_cache():
+    """Write _MODID_CACHE back to CACHE_PATH, dropping entries for jars
+    that were removed or changed since they were read."""
+    try:
+        current = {k: v for k, v in _MODID_CACHE.items() if _cache_entry_current(k)}
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with CACHE_PATH.open("w") as f:
+            json.dump(current, f)
+    except Exception as e:
+        print(f"[DEBUG] Could not write modId cache {CACHE_PATH}: {e}")
 
 def reset_log():
     """Truncate the log file – it will be written to again."""
-    log_path = pathlib.Path(os.path.join(SERVER_ROOT_ABS, LOG_FILE))
     try:
-        log_path.write_text("")
-        # print(f"[DEBUG] Reset log {log_path}")
+        LOG_PATH.write_text("")
+        # print(f"[DEBUG] Reset log {LOG_PATH}")
     except Exception as e:
-        print(f"[DEBUG] Could not reset log {log_path}: {e}")
+        print(f"[DEBUG] Could not reset log {LOG_PATH}: {e}")
+
+def extract_missing_ids(data) -> List[str]:
+    """Return the distinct *mod IDs* that appear in a block of log output
+    (bytes or mmap), in order of first appearance."""
+    if data.find(_MOD_ID_MARKER) == -1:     # cheap substring check before the regex
+        return []
+    return [m.decode("utf-8", errors="ignore") for m in dict.fromkeys(_MOD_ID_RE.findall(data))]
+
+def scan_log(log_path) -> Tuple[bool, List[str]]:
+    """Search the log and return `(crashed, missing_ids)`.
 
-def extract_missing_ids(log_path):
-    """Return a list of *mod IDs* that appear in the log."""
-    missing = []
+    The file is memory-mapped so it is searched in place, without
+    reading or decoding it into a Python string.
+    """
     try:
-        content = pathlib.Path(log_path).read_text(errors="ignore")
-        for match in re.finditer(r"Mod ID: '([^']+)'", content):
-            missing.append(match.group(1))
+        with open(log_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return False, []
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+                if mm.find(_ERROR_BYTES) != -1:
+                    return True, []
+                return False, extract_missing_ids(mm)
     except Exception as e:
         print(f"[DEBUG] Failed to read log {log_path}: {e}")
-    return missing
+    return False, []
+
+def _stop_server(proc):
+    """Stop the server's whole process group, i.e. the start script *and*
+    the JVM it launched, which would otherwise outlive the script.
+
+    The group gets _STOP_GRACE seconds after SIGTERM to exit on its own;
+    waiting on the start script alone is not enough, as it dies at once
+    while the JVM is still saving.
+    """
+    pgid = proc.pid
+    try:
+        os.killpg(pgid, signal.SIGTERM)
+        deadline = time.monotonic() + _STOP_GRACE
+        while time.monotonic() < deadline:
+            proc.poll()                         # reap the leader, a zombie still counts as a member
+            os.killpg(pgid, 0)                  # raises once the group is empty
+            time.sleep(0.1)
+        os.killpg(pgid, signal.SIGKILL)         # anything still left in the group
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+def _tail_log(proc, stop, verdict):
+    """Follow LOG_PATH while `proc` runs and terminate it as soon as the
+    outcome is known: ERROR_STR (crash) or the "Done" line (started fine).
+    The reason is appended to `verdict`.
+    """
+    keep = max(len(_ERROR_BYTES), len(_DONE_MARKER)) - 1
+    tail = b""
+    fd = os.open(LOG_PATH, os.O_RDONLY)
+    try:
+        while not stop.is_set():
+            data = os.read(fd, _LOG_CHUNK)
+            if not data:
+                stop.wait(0.1)
+                continue
+            buf = tail + data
+            if _ERROR_BYTES in buf:
+                verdict.append("crash")
+            elif _DONE_MARKER in buf:
+                verdict.append("done")
+            else:
+                tail = buf[-keep:]
+                continue
+            _stop_server(proc)
+            return
+    finally:
+        os.close(fd)
 
 def run_server():
-    """Execute the server start script, write stdout+stderr to LOG_FILE."""
-    log_path = pathlib.Path(os.path.join(SERVER_ROOT_ABS, LOG_FILE))
+    """Execute the server start script, write stdout+stderr to LOG_FILE.
+
+    The log is watched while the server runs so it can be stopped as soon
+    as it crashes or finishes starting, instead of waiting for TIMEOUT.
+    """
     try:
-        with log_path.open("w") as log_f:
+        with LOG_PATH.open("w") as log_f:
             print(f"[DEBUG] Running server script {SERVER_SCRIPT} in {SERVER_ROOT_ABS}")
-            result = subprocess.run(
+            proc = subprocess.Popen(
                 [f"./{SERVER_SCRIPT}"],
                 cwd=SERVER_ROOT_ABS,
                 stdout=log_f,
                 stderr=log_f,
-                timeout=TIMEOUT,
-                text=True,
+                start_new_session=True,     # own process group, see _stop_server
             )
-        print(f"[DEBUG] Server exited with code {result.returncode}")
-        return result.returncode
+            stop = threading.Event()
+            verdict: List[str] = []
+            watcher = threading.Thread(target=_tail_log, args=(proc, stop, verdict), daemon=True)
+            watcher.start()
+            try:
+                returncode = proc.wait(timeout=TIMEOUT)
+            except BaseException:
+                # timeout, Ctrl-C (which no longer reaches the server's own
+                # session) or anything else: never leave the server running
+                _stop_server(proc)
+                raise
+            finally:
+                stop.set()
+                watcher.join()
+        if verdict == ["done"]:
+            print("[DEBUG] Server started, stopped it")
+            return 0
+        print(f"[DEBUG] Server exited with code {returncode}")
+        return returncode
     except subprocess.TimeoutExpired:
         print(f"[DEBUG] Server timed out after {TIMEOUT}s")
         return 124
@@ -116,44 +302,68 @@ def run_server():
 class mod:
     """Container for a single mod JAR and its metadata."""
     def __init__(self, path: pathlib.Path):
-        self.path = path
-        self.modid: Optional[str] = get_modid_from_jar(str(path))
+        # both names are fixed up front; `enabled` says which one is on disk
+        self._jar = str(path)
+        self._disabled = self._jar + ".disabled"
+        self.enabled = True
         self.dependencies: List[str] = []  # can be filled later if needed
 
+    @property
+    def path(self) -> pathlib.Path:
+        """Current location of the jar."""
+        return pathlib.Path(self._jar if self.enabled else self._disabled)
+
+    @property
+    def name(self) -> str:
+        """File name of the jar when enabled."""
+        return os.path.basename(self._jar)
+
+    @cached_property
+    def modid(self) -> Optional[str]:
+        """modId stored in the jar, read on first access."""
+        return get_modid_from_jar(str(self.path))
+
+    @property
+    def resolved(self) -> bool:
+        """Whether `modid` has been read yet."""
+        return "modid" in self.__dict__
+
     def enable(self):
         """Rename `something.jar.disabled` → `something.jar`."""
-        p = self.path
-        if p.name.endswith(".jar.disabled"):
-            new_path = p.with_name(p.name.replace(".jar.disabled", ".jar"))
+        if not self.enabled:
             try:
-                p.rename(new_path)
-                self.path = new_path
-                # print(f"[DEBUG] Enabled {p}")
+                os.replace(self._disabled, self._jar)
+                self.enabled = True
+                # print(f"[DEBUG] Enabled {self._jar}")
             except Exception as e:
-                print(f"[DEBUG] Could not enable {self.modid}: {e}")
+                print(f"[DEBUG] Could not enable {self._jar}: {e}")
 
     def disable(self):
         """Rename `something.jar` → `something.jar.disabled`."""
-        p = self.path
-        if p.suffix == ".jar":
-            new_path = p.with_name(p.name + ".disabled")
+        if self.enabled:
             try:
-                p.rename(new_path)
-                self.path = new_path
-                # print(f"[DEBUG] Disabled {p}")
+                os.replace(self._jar, self._disabled)
+                self.enabled = False
+                # print(f"[DEBUG] Disabled {self._jar}")
             except Exception as e:
-                print(f"[DEBUG] Could not disable {self.modid}: {e}")
+                print(f"[DEBUG] Could not disable {self._jar}: {e}")
 
 # Global list that will hold all discovered mods
 MODS: List[mod] = []
+# modId -> mod lookup, filled lazily by find_mod_by_id
+MODID_INDEX: Dict[str, mod] = {}
 
 def load_mods() -> List[mod]:
-    """Scan MODS_DIR once and build a list of `mod` objects."""
-    mods = []
-    mods_dir = pathlib.Path(os.path.join(SERVER_ROOT_ABS, MODS_DIR))
-    for p in mods_dir.glob("*.jar"):
-        mods.append(mod(p))
-    return mods
+    """Scan MODS_DIR once and build a list of `mod` objects.
+
+    Jars are not opened here; each modId is read lazily (see mod.modid).
+    """
+    try:
+        with os.scandir(MODS_PATH) as it:
+            return [mod(pathlib.Path(e.path)) for e in it if e.name.endswith(".jar") and e.is_file()]
+    except OSError as e:
+        print(f"[DEBUG] Could not scan {MODS_PATH}: {e}")
+        return []
 
 # ---------- HELPERS (modified) ---------- #
 def disable_all():
@@ -167,59 +377,51 @@ def enable_all():
         m.enable()
 
 def find_mod_by_id(target_id):
-    """Return the `mod` instance that matches target_id."""
-    for m in MODS:
-        if m.modid == target_id:
-            return m
-    return None
-
-# ---------- MAIN ---------- #
-def main():
-    print("[DEBUG] Starting mod‑crash‑finder")
-    # Build the mod list once
-    global MODS
-    MODS = load_mods()
-    total = len(MODS)
-
-    print(f"[DEBUG] Found {total} mod(s).")
+    """Return the `mod` instance that matches target_id.
 
-    if total == 0:
-        print('[DEBUG] Nothing to do, exiting...')
-        exit(1)
-
-    disable_all()
-    print("[DEBUG] All mods disabled. Starting test loop.")
+    MODID_INDEX is filled lazily: on a miss, jars not read yet are opened
+    one by one (those whose file name looks like target_id first) until
+    one matches, and every modId read on the way is indexed.
+    """
+    m = MODID_INDEX.get(target_id)
+    if m is not None:
+        return m
+    pending = [o for o in MODS if not o.resolved]
+    pending.sort(key=lambda o: guess_modid(o.path) != target_id)     # stable
+    for o in pending:
+        if o.modid is not None:
+            MODID_INDEX.setdefault(o.modid, o)
+        if o.modid == target_id:
+            return o
+    return None
 
-    for idx, m in enumerate(MODS, start=1):
-        mod_name = os.path.basename(str(m.path))
-        print(f"\n[{idx}/{total}] Enabling '{m.modid}' ({mod_name})...")
+# ---------- BISECTION ---------- #
+class ServerTimeout(Exception):
+    """The server neither crashed nor finished starting within TIMEOUT."""
 
-        m.enable()                 # enable this mod
-        reset_log()
+def crashes_with(batch: List[mod]) -> bool:
+    """Enable `batch`, run the server once and report whether ERROR_STR
+    showed up. Missing dependencies are enabled for a second run. Every
+    mod touched here is disabled again before returning.
 
+    Raises ServerTimeout if a run times out, since that says nothing
+    about whether the batch crashes.
+    """
+    for m in batch:
+        m.enable()
+    reset_log()
+    temp_mods = []
+    try:
         exit_code = run_server()
         if exit_code == 124:            # timed out
-            # print("   [I] Server timed out – skipping this mod.")
-            m.disable()
-            continue
-        
-        # time.sleep(2)                   # give the server a moment to finish
-
-        log_path = pathlib.Path(os.path.join(SERVER_ROOT_ABS, LOG_FILE))
-        try:
-            log_content = log_path.read_text(errors="ignore")
-        except Exception as e:
-            print(f"[DEBUG] Could not read log {log_path}: {e}")
-            log_content = ""
+            raise ServerTimeout(len(batch))
 
-        if ERROR_STR in log_content:
-            print(f"\n[X] Crash caused by {m.path}")
-            return
+        crashed, missing = scan_log(LOG_PATH)
+        if crashed:
+            return True
 
-        missing = extract_missing_ids(log_path)
         if missing:
             print(f"   [W] Missing deps: {' '.join(missing)}")
-            temp_mods = []
 
             for dep in missing:
                 # print(f"Searching missing dep '{dep}' …")
@@ -227,41 +429,101 @@ def main():
                 if dep_mod is None:
                     print(f"   [W] Cannot find jar for missing mod '{dep}'")
                     continue
+                if dep_mod in batch or dep_mod in temp_mods:
+                    continue
                 dep_mod.enable()
                 temp_mods.append(dep_mod)
 
             reset_log()
             exit_code = run_server()
-            time.sleep(2)
+            if exit_code == 124:
+                raise ServerTimeout(len(batch) + len(temp_mods))
+
+            crashed, _ = scan_log(LOG_PATH)
+            return crashed
+        return False
+    finally:
+        for tm in temp_mods:
+            tm.disable()
+        for m in batch:
+            m.disable()
 
-            try:
-                log_content = log_path.read_text(errors="ignore")
-            except Exception as e:
-                print(f"[DEBUG] Could not read log after enabling deps: {e}")
-                log_content = ""
+def _try(candidates: List[mod]) -> bool:
+    """Print what is being tested and return crashes_with(candidates)."""
+    names = ", ".join(m.name for m in candidates[:3])
+    if len(candidates) > 3:
+        names += ", …"
+    print(f"\n[{len(candidates)}] Testing {names}")
 
-            if ERROR_STR in log_content:
-                print(f"\n[X] Crash caused by {m.modid}")
-                for tm in temp_mods:
-                    tm.disable()
-                m.disable()
-                return
+    if not crashes_with(candidates):
+        print("   [X] Crash string not found.")
+        return False
+    return True
 
-            for tm in temp_mods:
-                tm.disable()
+def bisect(candidates: List[mod]) -> Optional[List[mod]]:
+    """Return the smallest set of mods found to trigger ERROR_STR, or
+    None if `candidates` does not crash.
 
-        print(f"   {m.modid} tested")
-        print("   [X] Crash string not found.")
-        m.disable()
+    The crashing set is halved on every crash, so a single culprit is
+    found in roughly 2·log2(N) server runs and comes back as a one-item
+    list. If neither half of a crashing set crashes on its own, the crash
+    needs mods from both halves and that whole set is returned.
+    """
+    if not _try(candidates):
+        return None
+    crashing = candidates
+    while len(crashing) > 1:
+        mid = len(crashing) // 2
+        first, second = crashing[:mid], crashing[mid:]
+        if _try(first):
+            crashing = first
+        elif _try(second):
+            crashing = second
+        else:
+            break
+    return crashing
 
-    enable_all()
+# ---------- MAIN ---------- #
+def main():
+    print("[DEBUG] Starting mod‑crash‑finder")
+    # Build the mod list once
+    global MODS, MODID_INDEX
+    load_modid_cache()
+    try:
+        MODS = load_mods()
+        MODID_INDEX = {}
+        total = len(MODS)
+
+        print(f"[DEBUG] Found {total} mod(s).")
 
-    print(f"Checked {total} mods.")
-    print("No offending mod found.")
+        if total == 0:
+            print('[DEBUG] Nothing to do, exiting...')
+            exit(1)
+
+        disable_all()
+        print("[DEBUG] All mods disabled. Starting bisection.")
+
+        try:
+            culprits = bisect(MODS)
+        except ServerTimeout as e:
+            print(f"\n[X] Server timed out after {TIMEOUT}s with {e.args[0]} mod(s) enabled; "
+                  "the result is inconclusive. Raise TIMEOUT and try again.")
+            return
+        if culprits is None:
+            print(f"\nThe server does not crash with all {total} mods enabled.")
+            print("No offending mod found.")
+        elif len(culprits) == 1:
+            culprits[0].enable()
+            print(f"\n[X] Crash caused by {culprits[0].path}")
+        else:
+            print(f"\n[X] Crash needs several of: {', '.join(m.name for m in culprits)}")
+    finally:
+        # however we leave, every mod ends up enabled again
+        enable_all()
+        save_modid_cache()
 
 if __name__ == "__main__":
     try:
         main()
     except KeyboardInterrupt:
-        print("Exiting, re-enabling all the mods")
-        enable_all()
\ No newline at end of file
+        print("Exiting, all the mods have been re-enabled")